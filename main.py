@@ -1,15 +1,35 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
+from fastapi.responses import ORJSONResponse
 from typing import Optional
-import requests
+from contextlib import asynccontextmanager
+import httpx
+import ijson
 import json
+import orjson
 import os
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
+import asyncio
+import hashlib
+import hmac
+from datetime import datetime
+from lxml import etree
+import io
 import uvicorn
 import time
 import threading
+import collections
 
-app = FastAPI(title="Multi-Purpose Data Scraping API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    app.state.client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=30.0,
+        http2=True,
+        headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+    )
+    yield
+    await app.state.client.aclose()
+
+app = FastAPI(title="Multi-Purpose Data Scraping API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 CONFIG = {
     "API_KEY": "kingvon",
@@ -17,104 +37,189 @@ CONFIG = {
     "MAX_REQUESTS_PER_MINUTE": 60
 }
 
-crypto_data_store = []
-request_times = {}
+CACHE_TTLS = {
+    "prices": 30,
+    "news": 300,
+    "weather": 600
+}
+
+CG_PARAMS_BASE = {
+    "vs_currency": "usd",
+    "order": "market_cap_desc",
+    "page": 1
+}
+
+WTTR_HEADERS = {
+    "User-Agent": "curl/7.68.0"
+}
+
+MAX_TRACKED_IPS = 100_000
+MAX_STORED_RECORDS = 1000
+MAX_CACHE_ENTRIES = 1000
+
+crypto_data_store = collections.deque()
+symbol_counter = collections.Counter()
+buckets = collections.OrderedDict()
+bucket_lock = threading.Lock()
 data_lock = threading.Lock()
+response_cache = collections.OrderedDict()
+cache_lock = asyncio.Lock()
+coingecko_throttle = asyncio.Lock()
+last_coingecko_call = 0.0
+etag_cache = {}
+
+async def throttle_coingecko():
+    global last_coingecko_call
+    async with coingecko_throttle:
+        delta = time.monotonic() - last_coingecko_call
+        if delta < CONFIG["REQUEST_DELAY"]:
+            await asyncio.sleep(CONFIG["REQUEST_DELAY"] - delta)
+        last_coingecko_call = time.monotonic()
+
+def make_cache_key(name, **kwargs):
+    raw = f"{name}:{json.dumps(kwargs, sort_keys=True)}"
+    return hashlib.blake2b(raw.encode()).hexdigest()
+
+async def cached_scrape(name, scraper, **kwargs):
+    key = make_cache_key(name, **kwargs)
+
+    async with cache_lock:
+        entry = response_cache.get(key)
+        if entry:
+            response_cache.move_to_end(key)
+
+    if entry and entry[0] > time.monotonic():
+        return entry[1], "HIT"
+
+    try:
+        value = await scraper(**kwargs)
+    except Exception:
+        if entry:
+            return entry[1], "STALE"
+        raise
+
+    async with cache_lock:
+        response_cache[key] = (time.monotonic() + CACHE_TTLS[name], value)
+        response_cache.move_to_end(key)
+        if len(response_cache) > MAX_CACHE_ENTRIES:
+            response_cache.popitem(last=False)
+
+    return value, "MISS"
 
 def rate_limit_check(request: Request):
     client_ip = request.client.host
-    current_time = datetime.now()
-    
-    if client_ip not in request_times:
-        request_times[client_ip] = []
-    
-    request_times[client_ip] = [
-        req_time for req_time in request_times[client_ip] 
-        if current_time - req_time < timedelta(minutes=1)
-    ]
-    
-    if len(request_times[client_ip]) >= CONFIG["MAX_REQUESTS_PER_MINUTE"]:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-    
-    request_times[client_ip].append(current_time)
+    capacity = CONFIG["MAX_REQUESTS_PER_MINUTE"]
+    now = time.monotonic()
+
+    with bucket_lock:
+        tokens, last_refill = buckets.get(client_ip, (capacity, now))
+        tokens = min(capacity, tokens + (now - last_refill) * (capacity / 60.0))
+
+        if tokens < 1:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+
+        buckets[client_ip] = (tokens - 1, now)
+        buckets.move_to_end(client_ip)
+        if len(buckets) > MAX_TRACKED_IPS:
+            buckets.popitem(last=False)
+
     return True
 
 def verify_api_key(request: Request, x_api_key: str = Header(None)):
     rate_limit_check(request)
-    if x_api_key != CONFIG["API_KEY"]:
+    if not x_api_key or not hmac.compare_digest(x_api_key.encode("utf-8"), CONFIG["API_KEY"].encode()):
         raise HTTPException(status_code=401, detail="Invalid API Key")
     return True
 
 def load_data():
-    with data_lock:
-        return crypto_data_store.copy()
+    # list(deque) is atomic under the GIL, so readers don't need the lock
+    return list(crypto_data_store)
 
 def save_data(data):
     with data_lock:
+        for record in data:
+            symbol_counter[record.get('symbol', 'UNKNOWN')] += 1
         crypto_data_store.extend(data)
-        if len(crypto_data_store) > 1000:
-            crypto_data_store[:] = crypto_data_store[-500:]
 
-def scrape_crypto_prices(symbols=None, limit=10):
-    time.sleep(CONFIG["REQUEST_DELAY"])
+        while len(crypto_data_store) > MAX_STORED_RECORDS:
+            dropped = crypto_data_store.popleft()
+            symbol = dropped.get('symbol', 'UNKNOWN')
+            symbol_counter[symbol] -= 1
+            if symbol_counter[symbol] <= 0:
+                del symbol_counter[symbol]
+
+class ChunkReader:
+    def __init__(self, response):
+        self._chunks = response.aiter_bytes()
+
+    async def read(self, size=-1):
+        if size == 0:
+            return b""
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+async def scrape_crypto_prices(symbols=None, limit=10):
+    await throttle_coingecko()
     url = "https://api.coingecko.com/api/v3/coins/markets"
-    params = {
-        "vs_currency": "usd",
-        "order": "market_cap_desc", 
-        "per_page": limit,
-        "page": 1
-    }
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    
-    response = requests.get(url, params=params, headers=headers, timeout=10)
-    response.raise_for_status()
-    
-    data = response.json()
+    params = CG_PARAMS_BASE | {"per_page": limit}
+
     result = []
-    
-    symbol_list = symbols.split(",") if symbols else None
-    
-    for coin in data:
-        if symbol_list and coin['symbol'].upper() not in [s.upper().strip() for s in symbol_list]:
-            continue
-            
-        crypto_info = {
-            "symbol": coin['symbol'].upper(),
-            "name": coin['name'],
-            "price": coin['current_price'],
-            "market_cap": coin.get('market_cap'),
-            "volume_24h": coin.get('total_volume'),
-            "change_24h": coin.get('price_change_percentage_24h'),
-            "timestamp": datetime.now().isoformat()
-        }
-        result.append(crypto_info)
+
+    wanted = frozenset(s.strip().upper() for s in symbols.split(",")) if symbols else None
+    now_iso = datetime.now().isoformat()
+
+    async with app.state.client.stream("GET", url, params=params) as response:
+        response.raise_for_status()
+
+        async for coin in ijson.items(ChunkReader(response), 'item'):
+            sym = coin['symbol'].upper()
+            if wanted is not None and sym not in wanted:
+                continue
+
+            crypto_info = {
+                "symbol": sym,
+                "name": coin['name'],
+                "price": coin['current_price'],
+                "market_cap": coin.get('market_cap'),
+                "volume_24h": coin.get('total_volume'),
+                "change_24h": coin.get('price_change_percentage_24h'),
+                "timestamp": now_iso
+            }
+            result.append(crypto_info)
+
+            if len(result) >= limit:
+                break
     
     return result
 
-def scrape_crypto_news(limit=5):
+async def scrape_crypto_news(limit=5):
     url = "https://www.coindesk.com/arc/outboundfeeds/rss/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    
-    response = requests.get(url, headers=headers, timeout=10)
+
+    headers = {}
+    cached = etag_cache.get(url)
+    if cached and len(cached[2]) >= limit:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = await app.state.client.get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[2][:limit]
     response.raise_for_status()
-    
-    soup = BeautifulSoup(response.content, 'xml')
-    items = soup.find_all('item')[:limit]
-    
+
     news_data = []
-    for item in items:
+    for _, item in etree.iterparse(io.BytesIO(response.content), events=("end",), tag="item"):
         try:
-            title = item.find('title').text.strip()
-            link = item.find('link').text.strip()
-            pub_date = item.find('pubDate').text.strip()
-            description = item.find('description')
-            desc_text = description.text.strip() if description else "No description"
-            
+            title = item.findtext("title").strip()
+            link = item.findtext("link").strip()
+            pub_date = item.findtext("pubDate").strip()
+            description = item.findtext("description")
+            desc_text = description.strip() if description else "No description"
+
             news_item = {
                 "title": title,
                 "url": link,
@@ -125,19 +230,29 @@ def scrape_crypto_news(limit=5):
             news_data.append(news_item)
         except:
             continue
-    
+        finally:
+            item.clear()
+            while item.getprevious() is not None:
+                del item.getparent()[0]
+
+        if len(news_data) >= limit:
+            break
+
+    etag_cache[url] = (
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+        news_data
+    )
+
     return news_data
 
-def scrape_weather_data(city="Bangalore"):
+async def scrape_weather_data(city="Bangalore"):
     url = f"https://wttr.in/{city}?format=j1"
-    headers = {
-        "User-Agent": "curl/7.68.0"
-    }
-    
-    response = requests.get(url, headers=headers, timeout=10)
+
+    response = await app.state.client.get(url, headers=WTTR_HEADERS)
     response.raise_for_status()
-    
-    data = response.json()
+
+    data = orjson.loads(response.content)
     current = data['current_condition'][0]
     
     weather_info = {
@@ -155,42 +270,75 @@ def scrape_weather_data(city="Bangalore"):
 def root():
     return {"message": "Multi-Purpose Data Scraping API", "status": "running"}
 
+HEALTH_BODY = orjson.dumps({"status": "healthy"})
+
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "timestamp": datetime.now()}
+def health_check(verbose: bool = False):
+    if verbose:
+        return {"status": "healthy", "timestamp": datetime.now()}
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 @app.get("/crypto/prices")
-def get_crypto_prices(symbols: Optional[str] = None, authenticated: bool = Depends(verify_api_key)):
+async def get_crypto_prices(response: Response, symbols: Optional[str] = None, authenticated: bool = Depends(verify_api_key)):
     try:
-        result = scrape_crypto_prices(symbols, 10)
-        
-        existing_data = load_data()
-        existing_data.extend(result)
-        save_data(existing_data)
-        
+        result, cache_status = await cached_scrape("prices", scrape_crypto_prices, symbols=symbols, limit=10)
+        response.headers["X-Cache"] = cache_status
+
+        if cache_status == "MISS":
+            save_data(result)
+
         return {"data": result, "count": len(result)}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch crypto data: {str(e)}")
 
 @app.get("/crypto/news")
-def get_crypto_news(limit: int = 5, authenticated: bool = Depends(verify_api_key)):
+async def get_crypto_news(response: Response, limit: int = 5, authenticated: bool = Depends(verify_api_key)):
     try:
-        result = scrape_crypto_news(limit)
+        result, cache_status = await cached_scrape("news", scrape_crypto_news, limit=limit)
+        response.headers["X-Cache"] = cache_status
         return {"news": result, "count": len(result)}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch news: {str(e)}")
 
 @app.get("/weather")
-def get_weather_data(city: str = "Bangalore", authenticated: bool = Depends(verify_api_key)):
+async def get_weather_data(response: Response, city: str = "Bangalore", authenticated: bool = Depends(verify_api_key)):
     try:
-        result = scrape_weather_data(city)
+        result, cache_status = await cached_scrape("weather", scrape_weather_data, city=city)
+        response.headers["X-Cache"] = cache_status
         return {"weather": result}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch weather: {str(e)}")
 
+@app.get("/dashboard")
+async def get_dashboard(response: Response, city: str = "Bangalore", authenticated: bool = Depends(verify_api_key)):
+    outcomes = await asyncio.gather(
+        cached_scrape("prices", scrape_crypto_prices, symbols=None, limit=10),
+        cached_scrape("news", scrape_crypto_news, limit=5),
+        cached_scrape("weather", scrape_weather_data, city=city),
+        return_exceptions=True
+    )
+
+    sections = {}
+    cache_statuses = []
+    for name, outcome in zip(("prices", "news", "weather"), outcomes):
+        if isinstance(outcome, Exception):
+            sections[name] = None
+            cache_statuses.append(f"{name}=ERROR")
+            continue
+
+        value, cache_status = outcome
+        sections[name] = value
+        cache_statuses.append(f"{name}={cache_status}")
+
+        if name == "prices" and cache_status == "MISS":
+            save_data(value)
+
+    response.headers["X-Cache"] = ", ".join(cache_statuses)
+    return sections
+
 @app.get("/data/history")
 def get_stored_data(limit: int = 50, authenticated: bool = Depends(verify_api_key)):
     try:
@@ -206,28 +354,21 @@ def get_stored_data(limit: int = 50, authenticated: bool = Depends(verify_api_ke
 @app.get("/data/stats")
 def get_data_statistics(authenticated: bool = Depends(verify_api_key)):
     try:
-        data = load_data()
-        
-        if not data:
-            return {"message": "No data available"}
-        
-        symbols = {}
-        total_records = len(data)
-        
-        for record in data:
-            symbol = record.get('symbol', 'UNKNOWN')
-            if symbol in symbols:
-                symbols[symbol] += 1
-            else:
-                symbols[symbol] = 1
-        
+        with data_lock:
+            if not crypto_data_store:
+                return {"message": "No data available"}
+
+            total_records = len(crypto_data_store)
+            symbols = dict(symbol_counter)
+            last_updated = crypto_data_store[-1].get('timestamp')
+
         stats = {
             "total_records": total_records,
             "unique_symbols": len(symbols),
             "symbol_counts": symbols,
-            "last_updated": data[-1].get('timestamp') if data else None
+            "last_updated": last_updated
         }
-        
+
         return {"statistics": stats}
         
     except Exception as e:
@@ -249,9 +390,10 @@ def clear_stored_data(request: Request, authenticated: bool = Depends(verify_api
     try:
         with data_lock:
             crypto_data_store.clear()
+            symbol_counter.clear()
         return {"message": "All stored data cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear data: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=bool(os.environ.get("DEBUG")))